@@ -4,8 +4,88 @@ Responsible for combining multiple image segments with audio into a complete vid
 """
 
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
 import json
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# Stream parameters shared by every segment encode
+# Segments must have identical codec parameters, GOP structure and timebase so that
+# the concat demuxer can join them with stream copy
+SEGMENT_VIDEO_ARGS = [
+    '-profile:v', 'high',
+    '-level', '4.0',
+    '-g', '48',  # 2 second GOP at 24 fps
+    '-keyint_min', '48',
+    '-sc_threshold', '0',  # No extra keyframes on scene cuts
+    '-force_key_frames', 'expr:gte(t,n_forced*2)',  # Keyframe every 2 seconds, starting at 0
+]
+SEGMENT_STREAM_ARGS = [
+    *SEGMENT_VIDEO_ARGS,
+    '-video_track_timescale', '90000',
+    '-ar', '48000',
+    '-ac', '2',
+]
+
+# ASS dialogue text escaping, applied in a single pass over each subtitle
+# Line breaks become \N and braces are escaped so they aren't parsed as override tags
+_ASS_TEXT_TRANS = str.maketrans({
+    '\n': '\\N',
+    '{': '\\{',
+    '}': '\\}',
+})
+
+# SRT timeline, format: 00:00:01,000 --> 00:00:03,000
+_SRT_TIMELINE_RE = re.compile(
+    r'(\d+):(\d\d):(\d\d)[,.](\d{1,3})\s*-->\s*(\d+):(\d\d):(\d\d)[,.](\d{1,3})'
+)
+
+
+def iter_srt(srt_path):
+    """
+    Iterate over the subtitles of an SRT file
+
+    The file is read line by line with a small state machine (index -> timeline -> text)
+    and each subtitle is yielded as soon as its block ends
+
+    Args:
+        srt_path (str): SRT subtitle file path
+
+    Yields:
+        tuple: (start, end, text), start and end in seconds
+    """
+    timeline = None
+    text_lines = []
+
+    # utf-8-sig also handles files saved with a BOM
+    with open(srt_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+
+            if timeline is None:
+                # Waiting for the timeline, skip the index line and stray blank lines
+                match = _SRT_TIMELINE_RE.match(line.strip())
+                if match:
+                    timeline = _srt_match_to_seconds(match)
+            elif line.strip():
+                # Subtitle text may have multiple lines
+                text_lines.append(line)
+            else:
+                # Blank line ends the current subtitle block
+                if text_lines:
+                    yield timeline[0], timeline[1], '\n'.join(text_lines)
+                timeline = None
+                text_lines = []
+
+    # Last block may not be followed by a blank line
+    if timeline is not None and text_lines:
+        yield timeline[0], timeline[1], '\n'.join(text_lines)
 
 
 def parse_srt_file(srt_path):
@@ -21,62 +101,88 @@ def parse_srt_file(srt_path):
             - end: End time (seconds)
             - text: Subtitle text
     """
-    subtitles = []
+    return [
+        {'start': start, 'end': end, 'text': text}
+        for start, end, text in iter_srt(srt_path)
+    ]
+
+
+def _srt_match_to_seconds(match):
+    """
+    Convert a matched SRT timeline to start and end seconds
+
+    Args:
+        match (re.Match): Match of _SRT_TIMELINE_RE
 
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    Returns:
+        tuple: (start, end) in seconds
+    """
+    h1, m1, s1, ms1, h2, m2, s2, ms2 = match.groups()
+    start = int(h1) * 3600 + int(m1) * 60 + int(s1) + int(ms1.ljust(3, '0')) / 1000.0
+    end = int(h2) * 3600 + int(m2) * 60 + int(s2) + int(ms2.ljust(3, '0')) / 1000.0
+    return start, end
 
-    # Split subtitle blocks by empty lines
-    blocks = content.strip().split('\n\n')
 
-    for block in blocks:
-        lines = block.split('\n')
-        if len(lines) >= 3:
-            # Parse timeline, format: 00:00:01,000 --> 00:00:03,000
-            time_line = lines[1]
-            start_str, end_str = time_line.split(' --> ')
+def _run_ffmpeg(cmd, tail_lines=100):
+    """
+    Run an FFmpeg command, streaming stderr and keeping only its last lines
 
-            # Convert time string to seconds
-            start_time = srt_time_to_seconds(start_str)
-            end_time = srt_time_to_seconds(end_str)
+    FFmpeg writes nothing useful to stdout here, and reading stderr as it is produced
+    avoids holding the whole log in memory or blocking on a full pipe
 
-            # Subtitle text may have multiple lines
-            text = '\n'.join(lines[2:])
+    Args:
+        cmd (list): FFmpeg command
+        tail_lines (int): Number of stderr lines to keep for error reporting
 
-            subtitles.append({
-                'start': start_time,
-                'end': end_time,
-                'text': text
-            })
+    Returns:
+        subprocess.CompletedProcess: Result with returncode and the stderr tail
+    """
+    with subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True, errors='replace') as proc:
+        stderr_tail = deque(proc.stderr, maxlen=tail_lines)
+        returncode = proc.wait()
 
-    return subtitles
+    return subprocess.CompletedProcess(cmd, returncode, stderr=''.join(stderr_tail))
 
 
-def srt_time_to_seconds(time_str):
+def _file_cache_key(path):
     """
-    Convert SRT time format to seconds
+    Build a cache key for a media file so cached probe results are invalidated when the file changes
 
     Args:
-        time_str (str): Time string, format: 00:00:01,000
+        path (str): File path
 
     Returns:
-        float: Seconds
+        tuple: (absolute path, modification time, size)
     """
-    # Format: HH:MM:SS,mmm
-    time_part, ms_part = time_str.split(',')
-    h, m, s = map(int, time_part.split(':'))
-    ms = int(ms_part)
-
-    return h * 3600 + m * 60 + s + ms / 1000.0
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
 
 
 def get_audio_duration(audio_path):
     """
     Get audio file duration using FFprobe
+    Results are cached per file (path, mtime, size)
 
     Args:
         audio_path (str): Audio file path
 
+    Returns:
+        float: Duration in seconds
+    """
+    return _probe_audio_duration(*_file_cache_key(audio_path))
+
+
+@functools.lru_cache(maxsize=256)
+def _probe_audio_duration(audio_path, mtime_ns, size):
+    """
+    Run FFprobe for the audio duration, cached by get_audio_duration's file key
+
+    Args:
+        audio_path (str): Absolute audio file path
+        mtime_ns (int): File modification time, only part of the cache key
+        size (int): File size, only part of the cache key
+
     Returns:
         float: Duration in seconds
     """
@@ -95,18 +201,37 @@ def get_audio_duration(audio_path):
 def get_video_info(video_path):
     """
     Get video dimensions and duration using FFprobe
+    Results are cached per file (path, mtime, size)
 
     Args:
         video_path (str): Video file path
 
     Returns:
-        dict: Video information with keys 'width', 'height', 'duration'
+        dict: Video information with keys 'codec', 'profile', 'level', 'pix_fmt', 'frame_rate',
+            'width', 'height', 'duration'
+    """
+    # Return a copy so callers can't modify the cached value
+    return dict(_probe_video_info(*_file_cache_key(video_path)))
+
+
+@functools.lru_cache(maxsize=256)
+def _probe_video_info(video_path, mtime_ns, size):
+    """
+    Run FFprobe for the video stream information, cached by get_video_info's file key
+
+    Args:
+        video_path (str): Absolute video file path
+        mtime_ns (int): File modification time, only part of the cache key
+        size (int): File size, only part of the cache key
+
+    Returns:
+        dict: Video information, see get_video_info
     """
     cmd = [
         'ffprobe',
         '-v', 'error',
         '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height,duration',
+        '-show_entries', 'stream=codec_name,profile,level,pix_fmt,r_frame_rate,width,height,duration',
         '-of', 'json',
         video_path
     ]
@@ -116,6 +241,11 @@ def get_video_info(video_path):
 
     stream = data['streams'][0]
     return {
+        'codec': stream.get('codec_name'),
+        'profile': stream.get('profile'),
+        'level': stream.get('level'),
+        'pix_fmt': stream.get('pix_fmt'),
+        'frame_rate': stream.get('r_frame_rate'),
         'width': stream['width'],
         'height': stream['height'],
         'duration': float(stream.get('duration', 0))
@@ -131,10 +261,8 @@ def srt_to_ass(srt_path, ass_path, font_name='STHeiti Medium'):
         ass_path (str): Output ASS file path
         font_name (str): Font name to use
     """
-    subtitles = parse_srt_file(srt_path)
-
     # ASS file header with Chinese font
-    ass_content = f"""[Script Info]
+    header = f"""[Script Info]
 ScriptType: v4.00+
 PlayResX: 1920
 PlayResY: 1080
@@ -148,15 +276,16 @@ Style: Default,{font_name},48,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,-1,0,0
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
 
-    # Convert subtitles to ASS format
-    for sub in subtitles:
-        start_time = seconds_to_ass_time(sub['start'])
-        end_time = seconds_to_ass_time(sub['end'])
-        text = sub['text'].replace('\n', '\\N')
-        ass_content += f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{text}\n"
+    # Convert subtitles to ASS format in a single pass over the SRT file, collect lines and join once
+    parts = [header]
+    for start, end, text in iter_srt(srt_path):
+        start_time = seconds_to_ass_time(start)
+        end_time = seconds_to_ass_time(end)
+        text = text.translate(_ASS_TEXT_TRANS)
+        parts.append(f"Dialogue: 0,{start_time},{end_time},Default,,0,0,0,,{text}\n")
 
     with open(ass_path, 'w', encoding='utf-8') as f:
-        f.write(ass_content)
+        f.write(''.join(parts))
 
     print(f"Converted SRT to ASS: {ass_path}")
 
@@ -171,16 +300,222 @@ def seconds_to_ass_time(seconds):
     Returns:
         str: ASS time format
     """
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    cs = int((seconds % 1) * 100)
+    # Work in whole centiseconds to avoid float modulo rounding errors (e.g. 1.15 % 1 * 100 == 14.99...)
+    total_cs = max(0, round(seconds * 100))
+    h, rest = divmod(total_cs, 360000)
+    m, rest = divmod(rest, 6000)
+    s, cs = divmod(rest, 100)
     return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
 
 
-def process_single_segment(image_path, audio_path, output_path, video_path=None, subtitle_path=None):
+# H.264 encoders in order of preference, with their rate control and pixel format arguments
+# Hardware encoders are only used if FFmpeg was built with them and a test encode succeeds
+# (VAAPI is not listed: it needs explicit hwupload in every filter graph)
+H264_ENCODERS = [
+    ('h264_nvenc', ['-preset', 'p4', '-tune', 'hq', '-rc', 'vbr', '-cq', '23', '-b:v', '0', '-pix_fmt', 'yuv420p']),
+    ('h264_qsv', ['-preset', 'veryfast', '-global_quality', '23', '-pix_fmt', 'nv12']),
+    ('h264_videotoolbox', ['-b:v', '6M', '-pix_fmt', 'yuv420p']),
+]
+
+# Software fallback, always available
+LIBX264_ENCODER = ('libx264', ['-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p'])
+
+
+_encoder_lock = threading.Lock()
+
+
+def _pick_h264_encoder():
+    """
+    Pick the fastest available H.264 encoder
+    The probe is cached and serialized, so FFmpeg is only probed once per process even when
+    segments start in parallel, and every segment of a deck uses the same encoder
+
+    Returns:
+        tuple: (encoder name, encoder arguments)
+    """
+    with _encoder_lock:
+        return _probe_h264_encoder()
+
+
+@functools.lru_cache(maxsize=1)
+def _probe_h264_encoder():
+    """
+    Probe FFmpeg for the fastest working H.264 encoder, use _pick_h264_encoder instead
+
+    Returns:
+        tuple: (encoder name, encoder arguments)
+    """
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, timeout=10)
+        available = result.stdout if result.returncode == 0 else ''
+    except Exception as e:
+        print(f"Could not list FFmpeg encoders: {e}")
+        available = ''
+
+    for name, args in H264_ENCODERS:
+        if f" {name} " not in available:
+            continue
+
+        # The encoder can be compiled in without a usable device, try encoding one frame
+        # with the same video options the segment encodes use
+        test_cmd = [
+            'ffmpeg', '-hide_banner', '-v', 'error',
+            '-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1',
+            '-frames:v', '1',
+            '-c:v', name, *args,
+            *SEGMENT_VIDEO_ARGS,
+            '-f', 'null', '-'
+        ]
+        try:
+            test = subprocess.run(test_cmd, capture_output=True, text=True, timeout=15)
+        except Exception as e:
+            print(f"Hardware encoder {name} test failed: {e}")
+            continue
+        if test.returncode == 0:
+            print(f"Using hardware H.264 encoder: {name}")
+            return name, args
+
+    print("Using software H.264 encoder: libx264")
+    return LIBX264_ENCODER
+
+
+def _video_encoder_args(still_image=False, encoder=None):
+    """
+    Build the video encoder arguments for an FFmpeg command
+
+    Args:
+        still_image (bool): Content is a still image, enables libx264 stillimage tuning
+        encoder (tuple): (encoder name, encoder arguments) from _pick_h264_encoder (optional, picked if omitted)
+
+    Returns:
+        list: FFmpeg arguments
+    """
+    name, args = encoder or _pick_h264_encoder()
+    encoder_args = ['-c:v', name, *args]
+    if still_image and name == 'libx264':
+        encoder_args += ['-tune', 'stillimage']
+    return encoder_args
+
+
+_font_lock = threading.Lock()
+
+
+def _find_chinese_font():
+    """
+    Find an available Chinese font for burned-in subtitles
+    The lookup is cached and serialized, so it (and the fc-match fallback) runs once per process
+    even when segments start in parallel
+
+    Returns:
+        tuple: (font_file, font_name), font_file is None when only a font name could be determined
+    """
+    with _font_lock:
+        return _lookup_chinese_font()
+
+
+@functools.lru_cache(maxsize=1)
+def _lookup_chinese_font():
+    """
+    Look up an available Chinese font, use _find_chinese_font instead
+
+    Returns:
+        tuple: (font_file, font_name), font_file is None when only a font name could be determined
+    """
+    # Support Windows, macOS, and Linux font paths, paired with the family name used by ASS styles
+    font_paths = [
+        # Windows paths (common Chinese fonts)
+        ('C:/Windows/Fonts/msyh.ttc', 'Microsoft YaHei'),
+        ('C:/Windows/Fonts/msyhbd.ttc', 'Microsoft YaHei'),
+        ('C:/Windows/Fonts/simhei.ttf', 'SimHei'),  # 黑体
+        ('C:/Windows/Fonts/simsun.ttc', 'SimSun'),  # 宋体
+        ('C:/Windows/Fonts/simkai.ttf', 'KaiTi'),  # 楷体
+        ('C:/Windows/Fonts/STXIHEI.TTF', 'STXihei'),
+        # Linux paths (common Chinese fonts)
+        ('/usr/share/fonts/truetype/wqy/wqy-microhei.ttc', 'WenQuanYi Micro Hei'),
+        ('/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc', 'WenQuanYi Zen Hei'),
+        ('/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', 'Droid Sans Fallback'),
+        ('/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc', 'Noto Sans CJK SC'),
+        ('/usr/share/fonts/truetype/arphic/uming.ttc', 'AR PL UMing CN'),
+        ('/usr/share/fonts/truetype/arphic/ukai.ttc', 'AR PL UKai CN'),
+        # macOS paths
+        ('/System/Library/Fonts/STHeiti Medium.ttc', 'STHeiti Medium'),
+        ('/System/Library/Fonts/STHeiti Light.ttc', 'STHeiti Light'),
+        ('/System/Library/Fonts/PingFang.ttc', 'PingFang SC'),
+        ('/System/Library/Fonts/Hiragino Sans GB.ttc', 'Hiragino Sans GB'),
+        ('/Library/Fonts/Arial Unicode.ttf', 'Arial Unicode MS')
+    ]
+
+    for font_path, font_name in font_paths:
+        if os.path.exists(font_path):
+            print(f"Found Chinese font: {font_path}")
+            return font_path, font_name
+
+    print("Warning: No Chinese font found in standard locations")
+    print("Attempting to use system default font")
+    # Try to use fc-match to find a Chinese font on Linux/macOS
+    try:
+        result = subprocess.run(['fc-match', '-f', '%{file}|%{family[0]}', ':lang=zh'],
+                                capture_output=True, text=True, timeout=5)
+        if result.returncode == 0 and result.stdout.strip():
+            font_file, _, font_name = result.stdout.strip().partition('|')
+            print(f"Found font via fc-match: {font_file}")
+            return font_file, font_name
+    except Exception as e:
+        print(f"Could not find font with fc-match: {e}")
+
+    # Last resort: use platform-specific font name and let libass resolve it
+    return None, 'Microsoft YaHei' if os.name == 'nt' else 'Arial'
+
+
+def _escape_filter_path(path):
+    """
+    Escape a file path for use as a filter option value in an FFmpeg filter graph
+
+    Args:
+        path (str): File path
+
+    Returns:
+        str: Escaped path
+    """
+    # Forward slashes work on every platform and avoid one layer of backslash escaping
+    path = path.replace('\\', '/')
+    # First level: filter option value
+    for ch in ('\\', "'", ':'):
+        path = path.replace(ch, '\\' + ch)
+    # Second level: filter graph description
+    for ch in ('\\', "'", '[', ']', ',', ';'):
+        path = path.replace(ch, '\\' + ch)
+    return path
+
+
+def _build_subtitle_filter(subtitle_path, ass_path):
+    """
+    Convert an SRT file to ASS and build the ass filter that burns it into the video
+
+    Args:
+        subtitle_path (str): SRT subtitle file path
+        ass_path (str): Output ASS file path, the caller is responsible for removing it
+
+    Returns:
+        str: ass filter description
+    """
+    # The font is referenced by family name only: every candidate is visible to libass's system
+    # font provider, and fontsdir would make libass load a whole font directory into memory
+    _, font_name = _find_chinese_font()
+    srt_to_ass(subtitle_path, ass_path, font_name=font_name)
+
+    subtitle_filter = f"ass={_escape_filter_path(ass_path)}"
+
+    print(f"Adding subtitles with ass filter using font: {font_name}")
+    return subtitle_filter
+
+
+def process_single_segment(image_path, audio_path, output_path, video_path=None, subtitle_path=None, threads=None,
+                           temp_dir=None, encoder=None):
     """
     Process a single segment: convert image to video with audio duration, optionally overlay digital human video, add subtitles
+    Everything is done in a single FFmpeg invocation so the segment is only encoded once
 
     Args:
         image_path (str): Image file path
@@ -188,206 +523,163 @@ def process_single_segment(image_path, audio_path, output_path, video_path=None,
         output_path (str): Output video file path
         video_path (str): Digital human video file path (optional)
         subtitle_path (str): Subtitle file path (optional)
+        threads (int): Encoder thread count (optional, FFmpeg picks one based on all CPU cores by default)
+        temp_dir (str): Directory for intermediate files (optional, defaults to the output directory)
+        encoder (tuple): H.264 encoder from _pick_h264_encoder (optional, picked if omitted)
 
     Returns:
         str: Output video file path
     """
     # Get audio duration
+    # The digital human video isn't probed: the filter graph trims and scales it without its metadata
     audio_duration = get_audio_duration(audio_path)
     print(f"Audio duration: {audio_duration} seconds")
 
-    # Build FFmpeg command
-    # Base: create video from image with audio
-    if video_path:
-        # Complex filter for overlaying digital human video
-        # 1. Create background video from image
-        # 2. Loop/trim digital human video to match audio duration
-        # 3. Scale digital human video to 1/5 of background width
-        # 4. Overlay at bottom-right corner
-
-        # First, get video info to calculate scaling
-        video_info = get_video_info(video_path)
-
-        # Build complex filter
-        filter_complex = (
-            # Input 0 (image): loop and scale to create background
-            "[0:v]loop=loop=-1:size=1:start=0,scale=1920:1080,setsar=1,fps=24[bg];"
-            # Input 1 (digital human video): trim or loop to match duration
-            f"[1:v]trim=duration={audio_duration},setpts=PTS-STARTPTS,"
-            # Scale to 1/5 of background width (384 pixels), maintain aspect ratio
-            "scale=384:-1[human];"
-            # Overlay human video on background at bottom-right with 20px padding
-            "[bg][human]overlay=W-w-20:H-h-20[outv]"
-        )
-
-        cmd = [
-            'ffmpeg',
-            '-y',  # Overwrite output file
-            '-loop', '1',  # Loop image
-            '-i', image_path,  # Input 0: background image
-            '-i', video_path,  # Input 1: digital human video
-            '-i', audio_path,  # Input 2: audio
-            '-filter_complex', filter_complex,
-            '-map', '[outv]',  # Use filtered video
-            '-map', '2:a',  # Use audio from input 2
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-t', str(audio_duration),  # Duration from audio
-            '-pix_fmt', 'yuv420p',
-            output_path
-        ]
-    else:
-        # Simple: just image + audio
-        cmd = [
-            'ffmpeg',
-            '-y',  # Overwrite output file
-            '-loop', '1',  # Loop image
-            '-i', image_path,  # Input: background image
-            '-i', audio_path,  # Input: audio
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-tune', 'stillimage',
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-t', str(audio_duration),  # Duration from audio
-            '-pix_fmt', 'yuv420p',
-            '-vf', 'scale=1920:1080,fps=24',
-            output_path
-        ]
+    # Intermediate files go to a private scratch directory so concurrent segments never collide
+    scratch_dir = tempfile.mkdtemp(prefix='segment_', dir=temp_dir or os.path.dirname(output_path) or None)
+    try:
+        # If subtitles are provided, convert them to ASS and burn them in with the ass filter
+        # libass looks up active events per frame, so the cost doesn't grow with the number of cues
+        subtitle_filter = None
+        if subtitle_path:
+            ass_path = os.path.join(scratch_dir, 'subtitles.ass')
+            subtitle_filter = _build_subtitle_filter(subtitle_path, ass_path)
+
+        # Build FFmpeg command
+        # Base: create video from image with audio
+        if video_path:
+            # Complex filter for overlaying digital human video
+            # 1. Create background video from image
+            # 2. Loop/trim digital human video to match audio duration
+            # 3. Scale digital human video to 1/5 of background width
+            # 4. Overlay at bottom-right corner
+
+            # Build complex filter
+            filter_complex = (
+                # Input 0 (image): loop and scale to create background
+                "[0:v]loop=loop=-1:size=1:start=0,scale=1920:1080,setsar=1,fps=24[bg];"
+                # Input 1 (digital human video): trim or loop to match duration
+                f"[1:v]trim=duration={audio_duration},setpts=PTS-STARTPTS,"
+                # Scale to 1/5 of background width (384 pixels), maintain aspect ratio
+                "scale=384:-1[human];"
+                # Overlay human video on background at bottom-right with 20px padding
+                "[bg][human]overlay=W-w-20:H-h-20"
+            )
 
-    # Execute FFmpeg command
-    print(f"Executing FFmpeg command...")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+            if subtitle_filter:
+                # Draw subtitles on top of the composited frame
+                filter_complex += f"[tmp];[tmp]{subtitle_filter}[outv]"
+            else:
+                filter_complex += "[outv]"
+
+            cmd = [
+                'ffmpeg',
+                '-y',  # Overwrite output file
+                '-loglevel', 'error',  # Only errors on stderr
+                '-nostats',
+                '-loop', '1',  # Loop image
+                '-i', image_path,  # Input 0: background image
+                '-i', video_path,  # Input 1: digital human video
+                '-i', audio_path,  # Input 2: audio
+                '-filter_complex', filter_complex,
+                '-map', '[outv]',  # Use filtered video
+                '-map', '2:a',  # Use audio from input 2
+                *_video_encoder_args(encoder=encoder),
+                '-c:a', 'aac',
+                '-b:a', '192k',
+                *SEGMENT_STREAM_ARGS,
+                '-t', str(audio_duration),  # Duration from audio
+            ]
+        else:
+            # Simple: just image + audio
+            # The image never changes, so it is read at 2 fps and only those frames are scaled and
+            # converted. fps=24 then duplicates them so every segment has the same frame rate for
+            # stream copy concat, -t cuts at 1/24 s precision and subtitles keep accurate cue timing.
+            # libx264 encodes the duplicated frames as cheap skip blocks
+            video_filter = 'scale=1920:1080,format=yuv420p,fps=24'
+            if subtitle_filter:
+                video_filter += f",{subtitle_filter}"
+
+            cmd = [
+                'ffmpeg',
+                '-y',  # Overwrite output file
+                '-loglevel', 'error',  # Only errors on stderr
+                '-nostats',
+                '-loop', '1',  # Loop image
+                '-framerate', '2',  # Read the still image at a low frame rate
+                '-i', image_path,  # Input: background image
+                '-i', audio_path,  # Input: audio
+                *_video_encoder_args(still_image=True, encoder=encoder),
+                '-c:a', 'aac',
+                '-b:a', '192k',
+                *SEGMENT_STREAM_ARGS,
+                '-t', str(audio_duration),  # Duration from audio
+                '-vf', video_filter,
+            ]
+
+        if threads:
+            cmd += ['-threads', str(threads)]
+        cmd.append(output_path)
+
+        # Execute FFmpeg command
+        print(f"Executing FFmpeg command...")
+        result = _run_ffmpeg(cmd)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
 
     if result.returncode != 0:
         print(f"FFmpeg stderr: {result.stderr}")
         raise RuntimeError(f"FFmpeg failed with return code {result.returncode}")
 
-    # If subtitles are provided, add them using drawtext filter (most reliable for Chinese)
-    if subtitle_path:
-        temp_output = output_path + '.temp.mp4'
-        os.rename(output_path, temp_output)
-
-        # Find available Chinese font file
-        # Support Windows, macOS, and Linux font paths
-        font_paths = [
-            # Windows paths (common Chinese fonts)
-            'C:/Windows/Fonts/msyh.ttc',  # Microsoft YaHei
-            'C:/Windows/Fonts/msyhbd.ttc',  # Microsoft YaHei Bold
-            'C:/Windows/Fonts/simhei.ttf',  # SimHei (黑体)
-            'C:/Windows/Fonts/simsun.ttc',  # SimSun (宋体)
-            'C:/Windows/Fonts/simkai.ttf',  # KaiTi (楷体)
-            'C:/Windows/Fonts/STXIHEI.TTF',  # STXihei
-            # Linux paths (common Chinese fonts)
-            '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
-            '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
-            '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
-            '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/truetype/arphic/uming.ttc',
-            '/usr/share/fonts/truetype/arphic/ukai.ttc',
-            # macOS paths
-            '/System/Library/Fonts/STHeiti Medium.ttc',
-            '/System/Library/Fonts/STHeiti Light.ttc',
-            '/System/Library/Fonts/PingFang.ttc',
-            '/System/Library/Fonts/Hiragino Sans GB.ttc',
-            '/Library/Fonts/Arial Unicode.ttf'
-        ]
+    print(f"Segment processed successfully: {output_path}")
+    return output_path
 
-        font_file = None
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                font_file = font_path
-                print(f"Found Chinese font: {font_file}")
-                break
-
-        if not font_file:
-            print("Warning: No Chinese font found in standard locations")
-            print("Attempting to use system default font")
-            # Try to use fc-match to find a Chinese font on Linux/macOS
-            try:
-                result = subprocess.run(['fc-match', '-f', '%{file}', ':lang=zh'],
-                                        capture_output=True, text=True, timeout=5)
-                if result.returncode == 0 and result.stdout.strip():
-                    font_file = result.stdout.strip()
-                    print(f"Found font via fc-match: {font_file}")
-                else:
-                    # Last resort: try common font names
-                    font_file = 'Microsoft YaHei' if os.name == 'nt' else 'Arial'
-            except Exception as e:
-                print(f"Could not find font with fc-match: {e}")
-                # Use platform-specific fallback
-                font_file = 'Microsoft YaHei' if os.name == 'nt' else 'Arial'
-
-        # Parse SRT file
-        subtitles = parse_srt_file(subtitle_path)
-
-        # Build drawtext filter chain for each subtitle
-        # Each subtitle becomes a separate drawtext that's enabled only during its time range
-        drawtext_filters = []
-
-        for i, sub in enumerate(subtitles):
-            # Escape text for FFmpeg (escape single quotes and colons)
-            text = sub['text'].replace("'", "'\\\\\\''").replace(':', '\\:')
-
-            # Enable subtitle only during its time range
-            enable_condition = f"between(t,{sub['start']},{sub['end']})"
-
-            # Build drawtext filter
-            drawtext = (
-                f"drawtext=fontfile='{font_file}'"
-                f":text='{text}'"
-                f":x=(w-text_w)/2"  # Center horizontally
-                f":y=h-th-50"  # 50px from bottom
-                f":fontsize=48"
-                f":fontcolor=white"
-                f":borderw=3"
-                f":bordercolor=black"
-                f":enable='{enable_condition}'"
-            )
-            drawtext_filters.append(drawtext)
 
-        # Combine all drawtext filters
-        vf_filter = ','.join(drawtext_filters)
+def _escape_concat_path(path):
+    """
+    Quote a path for an FFmpeg concat demuxer list file
 
-        # Add subtitles using drawtext filter
-        subtitle_cmd = [
-            'ffmpeg',
-            '-y',
-            '-i', temp_output,
-            '-vf', vf_filter,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-c:a', 'copy',
-            output_path
-        ]
+    Args:
+        path (str): File path
 
-        print(f"Adding subtitles with drawtext using font: {font_file}")
-        print(f"Total {len(subtitles)} subtitle entries")
-        result = subprocess.run(subtitle_cmd, capture_output=True, text=True)
+    Returns:
+        str: Quoted path, embedded single quotes are escaped as '\\''
+    """
+    return "'" + path.replace("'", "'\\''") + "'"
 
-        if result.returncode != 0:
-            print(f"FFmpeg subtitle stderr: {result.stderr}")
-            # Restore original if subtitle adding fails
-            os.rename(temp_output, output_path)
-        else:
-            # Remove temporary file
-            os.remove(temp_output)
 
-    print(f"Segment processed successfully: {output_path}")
-    return output_path
+def _validate_concat_compat(paths):
+    """
+    Check that video files can be joined by the concat demuxer with stream copy
 
+    Args:
+        paths (list): Video file paths
 
-def synthesize_video(segments_data, output_path="output/final_video.mp4", transition_duration=0):
+    Returns:
+        bool: True if all files share codec, profile, level, pixel format, frame rate and dimensions
+    """
+    reference = None
+    for path in paths:
+        info = get_video_info(path)
+        params = (
+            info['codec'], info['profile'], info['level'], info['pix_fmt'], info['frame_rate'],
+            info['width'], info['height']
+        )
+        if reference is None:
+            reference = params
+        elif params != reference:
+            print(f"Segment {path} has video parameters {params}, expected {reference}")
+            return False
+    return True
+
+
+def synthesize_video(segments_data, output_path="output/final_video.mp4", transition_duration=0, max_workers=None):
     """
     Synthesize final video from image and audio segments
 
     Processing logic:
-    1. First synthesize each segment completely (image + audio + optional digital human video + optional subtitles)
+    1. First synthesize each segment completely (image + audio + optional digital human video + optional subtitles),
+       segments are independent so they are encoded in parallel
     2. Then concatenate the finished segment videos in order
 
     Args:
@@ -398,6 +690,8 @@ def synthesize_video(segments_data, output_path="output/final_video.mp4", transi
             - subtitle_path: Subtitle file path (optional, starts from 0s for each segment)
         output_path (str): Output video file path
         transition_duration (float): Transition duration (seconds), default 0 (no transition)
+        max_workers (int): Number of segments encoded concurrently, default is half of the CPU cores
+            (each FFmpeg process already runs several encoder threads)
 
     Returns:
         str: Output video file path
@@ -413,25 +707,51 @@ def synthesize_video(segments_data, output_path="output/final_video.mp4", transi
     os.makedirs(temp_dir, exist_ok=True)
 
     # Step 1: Process and save each segment individually
-    segment_video_paths = []
+    # Each FFmpeg encode runs in its own subprocess, so threads are enough to run them in parallel
     total_segments = len(segments_data)
-
-    for i, segment in enumerate(segments_data, 1):
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // 2)
+    max_workers = min(max_workers, total_segments) or 1
+    # Split the cores between concurrent encoders instead of letting each one size itself for the whole machine
+    encoder_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    # Pick the encoder once for the whole deck, mixed encoders can't be joined with stream copy
+    encoder = _pick_h264_encoder()
+
+    # Keep output paths indexed by segment order, futures may complete in any order
+    segment_video_paths = [None] * total_segments
+
+    def process_segment(i, segment):
         print(f"Processing segment {i}/{total_segments}...")
 
         # Output path for this segment in temp directory
         segment_output_path = os.path.join(temp_dir, f'segment_{i}.mp4')
 
         # Process single segment completely
-        process_single_segment(
+        return process_single_segment(
             image_path=segment['image_path'],
             audio_path=segment['audio_path'],
             output_path=segment_output_path,
             video_path=segment.get('video_path'),
-            subtitle_path=segment.get('subtitle_path')
+            subtitle_path=segment.get('subtitle_path'),
+            threads=encoder_threads,
+            temp_dir=temp_dir,
+            encoder=encoder
         )
 
-        segment_video_paths.append(segment_output_path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_segment, i, segment): i
+            for i, segment in enumerate(segments_data, 1)
+        }
+
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                segment_video_paths[i - 1] = future.result()
+        except Exception:
+            # Stop at the first failed segment, don't start the segments still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     # Step 2: Concatenate all segments using FFmpeg concat demuxer
     print("Concatenating all segments...")
@@ -440,23 +760,35 @@ def synthesize_video(segments_data, output_path="output/final_video.mp4", transi
     concat_file_path = os.path.join(temp_dir, 'concat_list.txt')
     with open(concat_file_path, 'w', encoding='utf-8') as f:
         for seg_path in segment_video_paths:
-            # Use absolute path to avoid issues
-            abs_path = os.path.abspath(seg_path)
-            f.write(f"file '{abs_path}'\n")
+            # Segments are written next to the list file, and relative entries are resolved
+            # against the directory of the list file
+            f.write(f"file {_escape_concat_path(os.path.basename(seg_path))}\n")
 
     # Concatenate using concat demuxer (fastest and most reliable)
+    # Stream copy only works if every segment has the same video parameters, re-encode otherwise
+    if _validate_concat_compat(segment_video_paths):
+        codec_args = ['-c', 'copy']  # Stream copy for fastest concatenation
+    else:
+        print("Warning: Segment video parameters differ, re-encoding during concatenation")
+        codec_args = [*_video_encoder_args(encoder=encoder), '-c:a', 'aac', '-b:a', '192k']
+
     concat_cmd = [
         'ffmpeg',
         '-y',
+        '-loglevel', 'error',
+        '-nostats',
+        '-fflags', '+genpts',  # Regenerate missing timestamps
         '-f', 'concat',
         '-safe', '0',
+        '-protocol_whitelist', 'file',
         '-i', concat_file_path,
-        '-c', 'copy',  # Stream copy for fastest concatenation
+        *codec_args,
+        '-avoid_negative_ts', 'make_zero',  # Start output timestamps at zero
         output_path
     ]
 
     print(f"Executing FFmpeg concatenation...")
-    result = subprocess.run(concat_cmd, capture_output=True, text=True)
+    result = _run_ffmpeg(concat_cmd)
 
     if result.returncode != 0:
         print(f"FFmpeg concatenation stderr: {result.stderr}")
@@ -478,3 +810,104 @@ def synthesize_video(segments_data, output_path="output/final_video.mp4", transi
 
     print("Video synthesis complete!")
     return output_path
+
+
+def synthesize_video_single_pass(segments_data, output_path="output/final_video.mp4"):
+    """
+    Synthesize final video from image and audio segments in a single FFmpeg invocation
+
+    Alternative to synthesize_video for small decks: all segments are composed in one filter graph
+    and joined with the concat filter, so there is only one encoder startup and no temporary
+    segment files. Every segment is rendered at 24 fps and all inputs and subtitle tracks stay open
+    for the whole run (each subtitled segment adds its own ass filter, fonts are resolved through
+    the system font provider), large decks should use synthesize_video, which encodes segments
+    in parallel.
+
+    Args:
+        segments_data (list): Segment data list, same format as synthesize_video
+        output_path (str): Output video file path
+
+    Returns:
+        str: Output video file path
+    """
+    print(f"Starting single pass video synthesis, total {len(segments_data)} segments")
+
+    output_dir = os.path.dirname(output_path) or 'output'
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Temporary ASS subtitle files live in a scratch directory until encoding is done
+    scratch_dir = tempfile.mkdtemp(prefix='synthesize_', dir=output_dir)
+
+    inputs = []
+    filters = []
+    concat_inputs = ''
+    input_index = 0
+
+    try:
+        for i, segment in enumerate(segments_data):
+            audio_duration = get_audio_duration(segment['audio_path'])
+            print(f"Segment {i + 1} audio duration: {audio_duration} seconds")
+
+            # Input: background image looped for the audio duration
+            inputs += ['-loop', '1', '-framerate', '24', '-t', str(audio_duration), '-i', segment['image_path']]
+            image_index = input_index
+            # Input: audio
+            inputs += ['-i', segment['audio_path']]
+            audio_index = input_index + 1
+            input_index += 2
+
+            video_filter = f"[{image_index}:v]scale=1920:1080,setsar=1,fps=24"
+
+            if segment.get('video_path'):
+                # Input: digital human video, overlaid at bottom-right with 20px padding
+                inputs += ['-i', segment['video_path']]
+                human_index = input_index
+                input_index += 1
+
+                filters.append(
+                    f"[{human_index}:v]trim=duration={audio_duration},setpts=PTS-STARTPTS,"
+                    f"scale=384:-1[human{i}]"
+                )
+                filters.append(f"{video_filter}[bg{i}]")
+                video_filter = f"[bg{i}][human{i}]overlay=W-w-20:H-h-20"
+
+            if segment.get('subtitle_path'):
+                ass_path = os.path.join(scratch_dir, f'subtitles_{i + 1}.ass')
+                video_filter += f",{_build_subtitle_filter(segment['subtitle_path'], ass_path)}"
+
+            filters.append(f"{video_filter},format=yuv420p[v{i}]")
+            # Normalize audio so the concat filter gets identical formats
+            filters.append(
+                f"[{audio_index}:a]atrim=duration={audio_duration},asetpts=PTS-STARTPTS,"
+                f"aresample=48000,aformat=channel_layouts=stereo[a{i}]"
+            )
+            concat_inputs += f"[v{i}][a{i}]"
+
+        filters.append(f"{concat_inputs}concat=n={len(segments_data)}:v=1:a=1[outv][outa]")
+
+        cmd = [
+            'ffmpeg',
+            '-y',  # Overwrite output file
+            '-loglevel', 'error',  # Only errors on stderr
+            '-nostats',
+            *inputs,
+            '-filter_complex', ';'.join(filters),
+            '-map', '[outv]',
+            '-map', '[outa]',
+            *_video_encoder_args(),
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            output_path
+        ]
+
+        print(f"Executing FFmpeg single pass synthesis...")
+        result = _run_ffmpeg(cmd)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if result.returncode != 0:
+        print(f"FFmpeg stderr: {result.stderr}")
+        raise RuntimeError(f"FFmpeg failed with return code {result.returncode}")
+
+    print("Video synthesis complete!")
+    return output_path